@@ -5,14 +5,24 @@ Groq LLM, and HuggingFace embeddings for answering medical questions.
 """
 
 from langchain_pinecone import PineconeVectorStore
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 from dotenv import load_dotenv
+import hashlib
+import hmac
 import os
-import traceback
+import re
+import time
+import httpx
+import numpy as np
+import torch
+from cachetools import LRUCache, TTLCache
+from sentence_transformers import CrossEncoder
 from langchain.prompts import ChatPromptTemplate
+from langchain.schema import Document
+from langchain_core.runnables import RunnableLambda
 from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from pinecone import Pinecone, ServerlessSpec
+from pinecone.grpc import PineconeGRPC as Pinecone
 from langchain_groq import ChatGroq
 from src.helper import download_embeddings
 from src.prompt import *
@@ -50,56 +60,212 @@ try:
     
     logger.info("API keys retrieved successfully")
     
-    # Initialize Pinecone
+    # Initialize Pinecone over gRPC (persistent HTTP/2 connection)
     logger.info("Connecting to Pinecone...")
     pc = Pinecone(api_key=PINECONE_API_KEY)
-    
+
     index_name = "medical-bot"
-    logger.info(f"Using Pinecone index: {index_name}")
-    
+    logger.info("Using Pinecone index: %s", index_name)
+
+    # Resolve the index host once per process so queries reuse one gRPC
+    # channel. The os.environ write only spares forked/reloaded children in
+    # this process tree; set PINECONE_INDEX_HOST in .env to skip the
+    # describe_index round-trip across restarts too.
+    index_host = os.getenv("PINECONE_INDEX_HOST")
+    if not index_host:
+        index_host = pc.describe_index(index_name).host
+        os.environ["PINECONE_INDEX_HOST"] = index_host
+    logger.info("Pinecone index host: %s", index_host)
+
     # Connect to existing Pinecone index
     logger.info("Connecting to Pinecone vector store...")
-    doc_search = PineconeVectorStore.from_existing_index(
-        index_name=index_name,
-        embedding=embeddings,
-    )
+    index = pc.Index(host=index_host)
+    doc_search = PineconeVectorStore(index=index, embedding=embeddings)
     logger.info("Successfully connected to Pinecone vector store")
     
-    # Create retriever
-    retriever = doc_search.as_retriever(search_type="similarity", search_kwargs={"k": 3})
-    logger.info("Document retriever configured with similarity search (k=3)")
+    # Create retriever: pull a wide candidate set cheaply from Pinecone,
+    # then rerank locally and keep only the best few for the LLM prompt
+    retriever = doc_search.as_retriever(search_type="similarity", search_kwargs={"k": 20})
+    logger.info("Document retriever configured with similarity search (k=20)")
+
+    # Tiny cross-encoder for CPU reranking of the candidate set
+    logger.info("Loading cross-encoder reranker...")
+    torch.set_num_threads(max(1, os.cpu_count() // 2))
+    reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-2-v2")
+    logger.info("Cross-encoder reranker loaded")
+
+    def _rerank(query: str, documents: list, top_k: int = 3):
+        """Score candidates with the cross-encoder and keep the top_k most relevant."""
+        if len(documents) <= top_k:
+            return documents
+        with torch.inference_mode():
+            scores = reranker.predict([(query, document.page_content) for document in documents])
+        best = np.argsort(scores)[::-1][:top_k]
+        return [documents[i] for i in best]
+
+    # Semantic retrieval cache: paraphrases of the same question land on the
+    # same coarse embedding grid cell, so they skip the Pinecone round-trip
+    retrieval_cache = LRUCache(maxsize=512)
+
+    def _retrieval_cache_key(query_vec):
+        """Quantize a query embedding onto a coarse grid to use as a cache key."""
+        return tuple((query_vec * 100).astype(np.int8).tolist()[:32])
+
+    def _retrieve_with_cache(query: str, query_vec):
+        """Fetch documents from Pinecone, reusing results for near-identical queries."""
+        key = _retrieval_cache_key(query_vec)
+        cached = retrieval_cache.get(key)
+        if cached is not None:
+            stored_vec, documents = cached
+            # Re-check true cosine similarity to rule out grid collisions
+            if float(np.dot(stored_vec, query_vec)) >= 0.95:
+                logger.info("Retrieval cache hit - skipping Pinecone query")
+                return documents
+
+        documents = retriever.invoke(query)
+        retrieval_cache[key] = (query_vec, documents)
+        return documents
+
+    def _trim_document(document, query_vec, max_sentences=4):
+        """Keep only the sentences of a document most similar to the query."""
+        sentences = [s for s in re.split(r"(?<=[.!?])\s+", document.page_content) if s.strip()]
+        if len(sentences) <= max_sentences:
+            return document
+
+        # Embeddings are L2-normalized, so the dot product is cosine similarity
+        sentence_vecs = np.array(embeddings.embed_documents(sentences))
+        scores = sentence_vecs @ query_vec
+        keep = sorted(np.argsort(scores)[-max_sentences:])
+        return Document(
+            page_content=" ".join(sentences[i] for i in keep),
+            metadata=document.metadata,
+        )
+
+    def _retrieve_trimmed(inputs: dict):
+        """
+        Retrieve documents and trim each to the sentences closest to the query.
+
+        Groq latency and cost scale with prompt tokens, so cutting each
+        retrieved chunk to its most relevant sentences roughly halves the
+        prefill work per query without losing the evidence the answer needs.
+        """
+        query = inputs["input"]
+        query_vec = np.array(embeddings.embed_query(query))
+        documents = _rerank(query, _retrieve_with_cache(query, query_vec))
+        return [_trim_document(document, query_vec) for document in documents]
     
-    # Initialize Groq LLM
+    # Initialize Groq LLM with one shared HTTP client. Explicit pool limits
+    # and a bounded timeout keep slow Groq responses from tying up workers
+    # or exhausting file descriptors under load.
     logger.info("Initializing Groq LLM...")
+    groq_http_client = httpx.Client(
+        http2=True,
+        limits=httpx.Limits(
+            max_keepalive_connections=64,
+            max_connections=128,
+            keepalive_expiry=30,
+        ),
+    )
     llm = ChatGroq(
         groq_api_key=GROK_API_KEY,
         model="llama-3.3-70b-versatile",
         temperature=0.3,
+        timeout=20,
+        max_retries=2,
+        http_client=groq_http_client,
     )
     logger.info("Groq LLM initialized successfully with model: llama-3.3-70b-versatile")
     
-    # Create prompt template
+    # Create prompt template, compiled once at startup; .partial() binds the
+    # static pieces so only {input} and {context} stay dynamic per request
     prompt = ChatPromptTemplate.from_messages([
         ("system", system_prompt),
         ("human", "{input}"),
-    ])
-    logger.info("Chat prompt template created")
+    ]).partial()
+    logger.info("Chat prompt template created (dynamic variables: %s)", prompt.input_variables)
     
     # Create chains
     logger.info("Creating document processing chains...")
     question_answer_chain = create_stuff_documents_chain(llm=llm, prompt=prompt)
     rag_chain = create_retrieval_chain(
-        retriever=retriever,
+        retriever=RunnableLambda(_retrieve_trimmed),
         combine_docs_chain=question_answer_chain,
     )
     logger.info("RAG chain created successfully")
-    
+
 except Exception as e:
-    logger.critical(f"Failed to initialize application components: {str(e)}")
-    logger.critical(f"Traceback: {traceback.format_exc()}")
+    # exc_info lets logging format the traceback lazily, only if a handler
+    # accepts the record
+    logger.critical("Failed to initialize application components: %s", str(e), exc_info=True)
     raise
 
 
+def _warmup():
+    """
+    Run a synthetic query through the embeddings model and RAG chain.
+
+    Pays the one-shot costs (tokenizer compilation, Pinecone gRPC connect,
+    Groq HTTP client init) at startup instead of on the first user request.
+    """
+    logger.info("Warming up embeddings model and RAG chain...")
+    start_time = time.time()
+    try:
+        embeddings.embed_query("warmup")
+        rag_chain.invoke({"input": "warmup"})
+        logger.info("Warm-up completed in %.3fs", time.time() - start_time)
+    except Exception as e:
+        logger.warning("Warm-up failed after %.3fs: %s", time.time() - start_time, str(e))
+
+
+# Warm up at startup so the first real request doesn't pay the lazy-init cost
+if os.getenv("SKIP_WARMUP") != "1":
+    _warmup()
+
+
+# Response cache: repeated questions ("what is diabetes") skip the whole
+# embedding + retrieval + LLM pipeline. Entries expire after one hour.
+response_cache = TTLCache(maxsize=1024, ttl=3600)
+
+
+def _cache_key(msg: str) -> bytes:
+    """Build a cache key from the normalized user message."""
+    return hashlib.blake2b(msg.lower().strip().encode(), digest_size=16).digest()
+
+
+def _sse_event(text: str) -> str:
+    """Format a text fragment as a server-sent event (handles embedded newlines)."""
+    return "".join(f"data: {line}\n" for line in text.split("\n")) + "\n"
+
+
+def _sse_response(generator) -> Response:
+    """Wrap a token generator in a streaming server-sent-events response."""
+    return Response(stream_with_context(generator), mimetype="text/event-stream")
+
+
+def _reject(message: str):
+    """
+    Reject an invalid chat message.
+
+    POST clients get a real 400 so monitoring can tell rejects from answers;
+    EventSource GETs get the message as an SSE body instead, because
+    EventSource cannot render non-200 responses.
+    """
+    if request.method == "POST":
+        return jsonify({"error": message}), 400
+    return _sse_response(iter([_sse_event(message), "data: [DONE]\n\n"]))
+
+
+# Cap request body size so oversized payloads are rejected before parsing
+MAX_CONTENT_LENGTH = 16 * 1024
+
+
+@app.before_request
+def enforce_content_length():
+    """Reject requests whose body exceeds the configured size cap."""
+    if request.content_length and request.content_length > MAX_CONTENT_LENGTH:
+        logger.warning("Request body too large: %s bytes", request.content_length)
+        return jsonify({"error": "Request body too large"}), 413
+
 
 @app.route("/")
 @log_execution_time
@@ -109,7 +275,7 @@ def index():
     try:
         return render_template('chat.html')
     except Exception as e:
-        logger.error(f"Error serving chat interface: {str(e)}")
+        logger.error("Error serving chat interface: %s", str(e))
         return jsonify({"error": "Failed to load chat interface"}), 500
 
 
@@ -123,68 +289,121 @@ def chat():
         str: Generated response from the medical chatbot
     """
     try:
-        # Get user message
-        msg = request.form.get("msg", "").strip()
-        
+        # Get user message (form field for POST, query string for EventSource GET)
+        msg = request.values.get("msg", "").strip()
+
+        # Validate before logging or doing any work, so empty, oversized or
+        # junk payloads cost nothing and never reach the pipeline
         if not msg:
             logger.warning("Empty message received from user")
-            return "Please enter a valid question."
-        
-        logger.info(f"Processing user query: {msg[:100]}...")  # Log first 100 chars
-        
-        # Validate message length
+            return _reject("Please enter a valid question.")
+
         if len(msg) > 1000:
-            logger.warning(f"Message too long ({len(msg)} characters): {msg[:50]}...")
-            return "Please keep your question under 1000 characters."
-        
-        # Generate response using RAG chain
-        logger.info("Invoking RAG chain to generate response...")
-        response = rag_chain.invoke({"input": msg})
-        
-        answer = response.get("answer", "I'm sorry, I couldn't generate a response.")
-        
-        # Log response metrics
-        logger.info(f"Generated response length: {len(answer)} characters")
-        logger.info(f"Response preview: {answer[:100]}...")
-        
-        # Log retrieved context info if available
-        if "context" in response:
-            context_docs = response["context"]
-            logger.info(f"Retrieved {len(context_docs)} context documents for response")
-        
-        return str(answer)
-        
-    except Exception as e:
-        error_msg = f"Error processing chat request: {str(e)}"
-        logger.error(error_msg)
-        logger.error(f"Traceback: {traceback.format_exc()}")
-        return "I'm sorry, I encountered an error processing your request. Please try again."
+            logger.warning("Message too long (%s characters)", len(msg))
+            return _reject("Please keep your question under 1000 characters.")
+
+        if not re.search(r"[A-Za-z]{2,}", msg):
+            logger.warning("Message rejected as junk (no alphabetic content)")
+            return _reject("Please enter a valid question.")
+
+        logger.info("Processing user query: %.100s...", msg)  # Log first 100 chars
+
+        # Check the response cache before doing any real work
+        cache_key = _cache_key(msg)
+        cached_answer = response_cache.get(cache_key)
+        if cached_answer is not None:
+            logger.info("Response cache hit - returning cached answer")
+            return _sse_response(iter([_sse_event(str(cached_answer)), "data: [DONE]\n\n"]))
+
+        def generate():
+            """Stream answer tokens from the RAG chain as server-sent events."""
+            answer_parts = []
+            try:
+                logger.info("Streaming RAG chain response...")
+                for chunk in rag_chain.stream({"input": msg}):
+                    token = chunk.get("answer", "")
+                    if token:
+                        answer_parts.append(token)
+                        yield _sse_event(token)
+
+                answer = "".join(answer_parts)
+                if answer:
+                    response_cache[cache_key] = answer
+
+                # Log response metrics
+                logger.info("Generated response length: %s characters", len(answer))
+                logger.info("Response preview: %.100s...", answer)
+
+            except Exception:
+                logger.exception("Error streaming chat response")
+                yield _sse_event("I'm sorry, I encountered an error processing your request. Please try again.")
+
+            yield "data: [DONE]\n\n"
+
+        return _sse_response(generate())
+
+    except Exception:
+        logger.exception("Error processing chat request")
+        return _sse_response(iter([_sse_event("I'm sorry, I encountered an error processing your request. Please try again."), "data: [DONE]\n\n"]))
+
+
+@app.route("/cache/clear", methods=["POST"])
+def clear_cache():
+    """
+    Clear the response cache (admin endpoint).
+
+    Requires the shared secret from the CACHE_CLEAR_TOKEN environment
+    variable in the X-Admin-Token header; the route is disabled when the
+    variable is unset, so the cache can't be flushed by arbitrary POSTs.
+    """
+    admin_token = os.getenv("CACHE_CLEAR_TOKEN")
+    request_token = request.headers.get("X-Admin-Token", "")
+    if not admin_token or not hmac.compare_digest(request_token, admin_token):
+        logger.warning("Unauthorized cache clear attempt rejected")
+        return jsonify({"error": "Forbidden"}), 403
+
+    cleared = len(response_cache)
+    response_cache.clear()
+    logger.info("Response cache cleared (%s entries removed)", cleared)
+    return jsonify({"cleared": cleared})
 
 
 @app.errorhandler(404)
 def not_found_error(error):
     """Handle 404 errors."""
-    logger.warning(f"404 error: {request.url}")
+    logger.warning("404 error: %s", request.url)
     return jsonify({"error": "Page not found"}), 404
 
 
 @app.errorhandler(500)
 def internal_error(error):
     """Handle 500 errors."""
-    logger.error(f"500 error: {str(error)}")
+    logger.error("500 error: %s", str(error))
     return jsonify({"error": "Internal server error"}), 500
 
 
 if __name__ == '__main__':
-    logger.info("Starting Medical Chatbot Flask application")
+    # The built-in Werkzeug server is single-threaded and only for local
+    # development; production serving goes through wsgi.py under Gunicorn
+    # with gevent workers so concurrent Groq calls don't block each other:
+    #   gunicorn -k gevent -w $(nproc) --timeout 60 -b 0.0.0.0:8080 wsgi:application
+    if os.getenv("FLASK_ENV", "development") != "development":
+        logger.critical("Refusing to start the dev server outside development; use Gunicorn via wsgi.py")
+        raise SystemExit(1)
+
+    # Debug mode (and Werkzeug's memory-doubling reloader) stays off unless
+    # explicitly requested
+    debug_mode = os.getenv("FLASK_DEBUG", "0") == "1"
+
+    logger.info("Starting Medical Chatbot Flask application (development server)")
     logger.info("Application configuration:")
-    logger.info(f"  - Host: 0.0.0.0")
-    logger.info(f"  - Port: 8080")
-    logger.info(f"  - Debug mode: True")
+    logger.info("  - Host: 0.0.0.0")
+    logger.info("  - Port: 8080")
+    logger.info("  - Debug mode: %s", debug_mode)
     logger.info("Application is ready to serve requests")
-    
+
     try:
-        app.run(host="0.0.0.0", port=8080, debug=True)
+        app.run(host="0.0.0.0", port=8080, debug=debug_mode)
     except Exception as e:
-        logger.critical(f"Failed to start Flask application: {str(e)}")
+        logger.critical("Failed to start Flask application: %s", str(e))
         raise
@@ -3,63 +3,128 @@ Helper functions for document processing and embeddings.
 This module contains utility functions for loading PDFs, splitting documents, and downloading embeddings.
 """
 
-from langchain.document_loaders import PyPDFLoader, DirectoryLoader
+from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
 from .logger import get_logger, log_execution_time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+import functools
 import os
+import numpy as np
 
 # Get logger for this module
 logger = get_logger(__name__)
 
+# Directory where the quantized ONNX model artifacts are cached between runs
+ONNX_MODEL_DIR = "models/miniLM-int8"
+
+
+def _load_pdf_file(file_path: str):
+    """
+    Load one PDF file with PyMuPDF and return a Document per page.
+
+    Runs inside a worker process, so it must stay at module level (picklable)
+    and import fitz locally rather than at module import time.
+
+    Args:
+        file_path (str): Path to a single PDF file
+
+    Returns:
+        list: List of Document objects, one per page
+    """
+    import fitz  # PyMuPDF
+
+    documents = []
+    with fitz.open(file_path) as pdf:
+        for page_number, page in enumerate(pdf):
+            documents.append(
+                Document(
+                    page_content=page.get_text("text"),
+                    metadata={"source": file_path, "page": page_number},
+                )
+            )
+    return documents
+
 
-@log_execution_time
 def load_pdf(path: str):
     """
-    Load PDF documents from a directory.
-    
+    Lazily load PDF documents from a directory in parallel with PyMuPDF.
+
+    Each PDF file is parsed in its own worker process; PyMuPDF is several
+    times faster per page than pdfminer and parsing is CPU-bound, so the
+    work scales across cores. Pages are yielded one at a time instead of
+    being accumulated, so peak memory stays bounded by the consumer's
+    batch size rather than the corpus size.
+
     Args:
         path (str): Path to directory containing PDF files
-        
-    Returns:
-        list: List of loaded documents
-        
+
+    Yields:
+        Document: One document per PDF page, in file order
+
     Raises:
         FileNotFoundError: If the specified path doesn't exist
         Exception: If document loading fails
     """
-    logger.info(f"Starting to load PDF documents from path: {path}")
-    
+    logger.info("Starting to load PDF documents from path: %s", path)
+
     try:
-        if not os.path.exists(path):
+        base_path = Path(path)
+        if not base_path.exists():
             raise FileNotFoundError(f"Path {path} does not exist")
-        
-        # Count PDF files for logging
-        pdf_files = []
-        for root, dirs, files in os.walk(path):
-            pdf_files.extend([f for f in files if f.lower().endswith('.pdf')])
-        
-        logger.info(f"Found {len(pdf_files)} PDF files to process")
-        
-        loader = DirectoryLoader(path, glob="**/*.pdf", loader_cls=PyPDFLoader)
-        documents = loader.load()
-        
-        logger.info(f"Successfully loaded {len(documents)} document chunks from {len(pdf_files)} PDF files")
-        
-        # Log some statistics
-        total_chars = sum(len(doc.page_content) for doc in documents)
-        logger.info(f"Total content loaded: {total_chars:,} characters")
-        
-        return documents
-        
+
+        # Single directory traversal: this listing both counts the PDFs and
+        # feeds the parallel loader below
+        pdf_files = sorted(str(p) for p in base_path.rglob("*.pdf"))
+        logger.info("Found %s PDF files to process", len(pdf_files))
+
+        page_count = 0
+        total_chars = 0
+        if pdf_files:
+            max_workers = os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                # Keep only a bounded window of files in flight: workers parse
+                # faster than the consumer embeds, so submitting everything up
+                # front would buffer the whole corpus in completed futures.
+                # Consuming futures in submission order preserves file order.
+                file_iter = iter(pdf_files)
+                in_flight = deque(
+                    executor.submit(_load_pdf_file, file_path)
+                    for file_path in islice(file_iter, max_workers + 1)
+                )
+                while in_flight:
+                    file_documents = in_flight.popleft().result()
+                    next_file = next(file_iter, None)
+                    if next_file is not None:
+                        in_flight.append(executor.submit(_load_pdf_file, next_file))
+                    for document in file_documents:
+                        page_count += 1
+                        total_chars += len(document.page_content)
+                        yield document
+
+        logger.info("Successfully loaded %s document chunks from %s PDF files", page_count, len(pdf_files))
+        logger.info("Total content loaded: %s characters", total_chars)
+
     except FileNotFoundError as e:
-        logger.error(f"Directory not found: {e}")
+        logger.error("Directory not found: %s", e)
         raise
     except Exception as e:
-        logger.error(f"Error loading PDF documents: {str(e)}")
+        logger.error("Error loading PDF documents: %s", str(e))
         raise Exception(f"Failed to load PDF documents: {str(e)}")
 
 
+@functools.lru_cache(maxsize=8)
+def _get_splitter(chunk_size: int, chunk_overlap: int):
+    """Return a shared RecursiveCharacterTextSplitter for the given settings."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+
+
 @log_execution_time
 def split_documents(extracted_data: list, chunk_size: int = 500, chunk_overlap: int = 20):
     """
@@ -77,64 +142,232 @@ def split_documents(extracted_data: list, chunk_size: int = 500, chunk_overlap:
         ValueError: If extracted_data is empty or invalid
         Exception: If document splitting fails
     """
-    logger.info(f"Starting document splitting with chunk_size={chunk_size}, chunk_overlap={chunk_overlap}")
-    
+    logger.info("Starting document splitting with chunk_size=%s, chunk_overlap=%s", chunk_size, chunk_overlap)
+
     try:
+        extracted_data = list(extracted_data)
         if not extracted_data:
             raise ValueError("No documents provided for splitting")
         
-        logger.info(f"Input: {len(extracted_data)} documents to split")
-        
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size, 
-            chunk_overlap=chunk_overlap
-        )
-        split_data = splitter.split_documents(extracted_data)
+        logger.info("Input: %s documents to split", len(extracted_data))
+
+        split_data = _get_splitter(chunk_size, chunk_overlap).split_documents(extracted_data)
         
-        logger.info(f"Successfully split documents into {len(split_data)} chunks")
+        logger.info("Successfully split documents into %s chunks", len(split_data))
         
         # Log chunk statistics
         if split_data:
             avg_chunk_size = sum(len(chunk.page_content) for chunk in split_data) / len(split_data)
-            logger.info(f"Average chunk size: {avg_chunk_size:.0f} characters")
+            logger.info("Average chunk size: %.0f characters", avg_chunk_size)
         
         return split_data
         
     except ValueError as e:
-        logger.error(f"Invalid input data: {e}")
+        logger.error("Invalid input data: %s", e)
         raise
     except Exception as e:
-        logger.error(f"Error splitting documents: {str(e)}")
+        logger.error("Error splitting documents: %s", str(e))
         raise Exception(f"Failed to split documents: {str(e)}")
 
 
+def split_documents_streaming(doc_iter, chunk_size: int = 500, chunk_overlap: int = 20, batch: int = 256):
+    """
+    Split a stream of documents into chunks, yielding them in fixed-size batches.
+
+    Consumes documents one at a time (e.g. straight from load_pdf) so only
+    one batch of chunks is resident at once, instead of the whole corpus
+    plus all of its chunks.
+
+    Args:
+        doc_iter (iterable): Iterable of documents to split
+        chunk_size (int): Size of each chunk
+        chunk_overlap (int): Overlap between chunks
+        batch (int): Number of chunks per yielded batch
+
+    Yields:
+        list: Batches of split document chunks
+
+    Raises:
+        Exception: If document splitting fails
+    """
+    logger.info("Starting streaming document splitting with chunk_size=%s, chunk_overlap=%s, batch=%s", chunk_size, chunk_overlap, batch)
+
+    try:
+        splitter = _get_splitter(chunk_size, chunk_overlap)
+
+        pending = []
+        total_chunks = 0
+        for document in doc_iter:
+            pending.extend(splitter.split_documents([document]))
+            while len(pending) >= batch:
+                total_chunks += batch
+                yield pending[:batch]
+                pending = pending[batch:]
+
+        if pending:
+            total_chunks += len(pending)
+            yield pending
+
+        logger.info("Successfully split documents into %s chunks", total_chunks)
+
+    except Exception as e:
+        logger.error("Error splitting documents: %s", str(e))
+        raise Exception(f"Failed to split documents: {str(e)}")
+
+
+def _build_onnx_embedder(model_name: str):
+    """
+    Export the embeddings model to ONNX, quantize it to INT8, and load it.
+
+    The exported + quantized artifacts are cached under ONNX_MODEL_DIR so the
+    export and quantization only happen once; later runs load directly from disk.
+
+    Args:
+        model_name (str): Name of the HuggingFace model to convert
+
+    Returns:
+        tuple: (ORTModelForFeatureExtraction, AutoTokenizer) ready for inference
+    """
+    # Imported here so the rest of this module works without optimum installed
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    if os.path.exists(os.path.join(ONNX_MODEL_DIR, "model_quantized.onnx")):
+        logger.info("Loading cached quantized ONNX model from %s", ONNX_MODEL_DIR)
+        model = ORTModelForFeatureExtraction.from_pretrained(
+            ONNX_MODEL_DIR, file_name="model_quantized.onnx"
+        )
+        tokenizer = AutoTokenizer.from_pretrained(ONNX_MODEL_DIR)
+        return model, tokenizer
+
+    logger.info("Exporting %s to ONNX (one-time operation)...", model_name)
+    model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+
+    logger.info("Quantizing ONNX model to INT8 (AVX512-VNNI dynamic quantization)...")
+    quantizer = ORTQuantizer.from_pretrained(model)
+    quantization_config = AutoQuantizationConfig.avx512_vnni(
+        is_static=False, per_channel=True
+    )
+    quantizer.quantize(save_dir=ONNX_MODEL_DIR, quantization_config=quantization_config)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    tokenizer.save_pretrained(ONNX_MODEL_DIR)
+
+    logger.info("Quantized ONNX model cached under %s", ONNX_MODEL_DIR)
+    model = ORTModelForFeatureExtraction.from_pretrained(
+        ONNX_MODEL_DIR, file_name="model_quantized.onnx"
+    )
+    return model, tokenizer
+
+
+class ONNXMiniLMEmbeddings(Embeddings):
+    """
+    MiniLM embeddings served by ONNX Runtime with INT8 quantized weights.
+
+    Drop-in replacement for HuggingFaceEmbeddings: INT8 inference cuts memory
+    bandwidth roughly 4x versus the stock PyTorch model, which dominates the
+    cost of both indexing and query-time embedding on CPU.
+    """
+
+    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
+        self.model_name = model_name
+        self._model, self._tokenizer = _build_onnx_embedder(model_name)
+
+    def _embed_batch(self, texts: list) -> np.ndarray:
+        """Tokenize a batch, run one ORT forward pass, mean-pool and L2-normalize."""
+        encoded = self._tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            return_tensors="np",
+        )
+        outputs = self._model(**encoded)
+        token_embeddings = outputs.last_hidden_state
+
+        # Mean pooling over real (non-padding) tokens
+        mask = encoded["attention_mask"][..., np.newaxis].astype(token_embeddings.dtype)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), a_min=1e-9, a_max=None)
+        embeddings = summed / counts
+
+        # L2 normalization so cosine similarity matches sentence-transformers
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.clip(norms, a_min=1e-12, a_max=None)
+
+    def embed_documents(self, texts: list, batch_size: int = 128) -> list:
+        """
+        Embed a list of documents in large length-sorted batches.
+
+        Batching amortizes tokenizer and transformer forward overhead across
+        many sequences; MiniLM on CPU scales near-linearly up to batch ~128.
+        Sorting by token length first groups similar-length sequences
+        together, so each batch is padded only to its own longest sequence
+        instead of the corpus-wide maximum.
+        """
+        if not texts:
+            return []
+        texts = list(texts)
+
+        # Sort by tokenized length so batches contain similar-length sequences
+        lengths = [
+            len(ids)
+            for ids in self._tokenizer(
+                texts, add_special_tokens=True, truncation=True
+            )["input_ids"]
+        ]
+        order = np.argsort(lengths, kind="stable")
+
+        sorted_vectors = []
+        for i in range(0, len(texts), batch_size):
+            batch = [texts[j] for j in order[i:i + batch_size]]
+            sorted_vectors.extend(self._embed_batch(batch).tolist())
+
+        # Undo the sort so vectors line up with the caller's text order
+        vectors = [None] * len(texts)
+        for position, original_index in enumerate(order):
+            vectors[original_index] = sorted_vectors[position]
+        return vectors
+
+    def embed_query(self, text: str) -> list:
+        """Embed a single query string."""
+        return self._embed_batch([text])[0].tolist()
+
+
+@functools.lru_cache(maxsize=4)
 @log_execution_time
-def download_embeddings(model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
+def download_embeddings(model_name: str = "sentence-transformers/all-MiniLM-L6-v2", verify: bool = False):
     """
     Download and initialize embeddings model.
-    
+
+    The returned instance is cached per model name, so repeated calls
+    (e.g. from app.py and store_index.py in the same process) reuse the
+    already-loaded model instead of reloading the weights.
+
     Args:
         model_name (str): Name of the HuggingFace model to use
-        
+        verify (bool): If True, run a test embedding to verify the model works
+
     Returns:
-        HuggingFaceEmbeddings: Initialized embeddings object
-        
+        ONNXMiniLMEmbeddings: Initialized embeddings object
+
     Raises:
         Exception: If model download or initialization fails
     """
-    logger.info(f"Initializing embeddings model: {model_name}")
-    
+    logger.info("Initializing embeddings model: %s", model_name)
+
     try:
-        embeddings = HuggingFaceEmbeddings(model_name=model_name)
-        logger.info(f"Successfully initialized embeddings model: {model_name}")
-        
-        # Test embedding to ensure it's working
-        test_text = "This is a test sentence."
-        test_embedding = embeddings.embed_query(test_text)
-        logger.info(f"Embeddings model working correctly. Embedding dimension: {len(test_embedding)}")
-        
+        embeddings = ONNXMiniLMEmbeddings(model_name=model_name)
+        logger.info("Successfully initialized embeddings model: %s", model_name)
+
+        if verify:
+            # Test embedding to ensure it's working
+            test_text = "This is a test sentence."
+            test_embedding = embeddings.embed_query(test_text)
+            logger.info("Embeddings model working correctly. Embedding dimension: %s", len(test_embedding))
+
         return embeddings
-        
+
     except Exception as e:
-        logger.error(f"Error initializing embeddings model {model_name}: {str(e)}")
+        logger.error("Error initializing embeddings model %s: %s", model_name, str(e))
         raise Exception(f"Failed to initialize embeddings model: {str(e)}")
\ No newline at end of file
@@ -3,9 +3,12 @@ Centralized logging configuration for Medical Chatbot GenAI Application.
 Provides colored console output, file logging with rotation, and performance monitoring.
 """
 
+import atexit
 import logging
 import logging.handlers
 import os
+import queue
+import sys
 import time
 import warnings
 from datetime import datetime
@@ -40,12 +43,19 @@ class ColoredFormatter(logging.Formatter):
         'CRITICAL': '\033[35m',   # Magenta
     }
     RESET = '\033[0m'
-    
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only emit ANSI codes when writing to a real terminal; piped or
+        # redirected output (e.g. under Gunicorn) stays plain
+        self._use_color = sys.stderr.isatty()
+
     def format(self, record):
         # Add color to level name
-        level_color = self.COLORS.get(record.levelname, '')
-        record.levelname = f"{level_color}{record.levelname}{self.RESET}"
-        
+        if self._use_color:
+            level_color = self.COLORS.get(record.levelname, '')
+            record.levelname = f"{level_color}{record.levelname}{self.RESET}"
+
         # Format the message
         formatted = super().format(record)
         return formatted
@@ -96,11 +106,22 @@ def setup_logging() -> logging.Logger:
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     file_handler.setFormatter(file_formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
-    
+
+    # Route records through a queue so console/file I/O (including file
+    # rotation) happens on a background thread instead of the request thread
+    log_queue = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(
+        log_queue,
+        console_handler,
+        file_handler,
+        respect_handler_level=True,
+    )
+    listener.start()
+    atexit.register(listener.stop)
+
     return logger
 
 
@@ -131,23 +152,25 @@ def log_execution_time(func: Callable) -> Callable:
     Returns:
         Callable: Decorated function
     """
+    # Resolve the logger once at decoration time rather than on every call
+    logger = get_logger(func.__module__)
+
     @wraps(func)  # This preserves the original function's name and metadata
     def wrapper(*args, **kwargs) -> Any:
-        logger = get_logger(func.__module__)
-        start_time = time.time()
-        
+        start_time = time.perf_counter()
+
         try:
             logger.debug(f"Starting execution of {func.__name__}")
             result = func(*args, **kwargs)
-            execution_time = time.time() - start_time
+            execution_time = time.perf_counter() - start_time
             logger.info(f"{func.__name__} executed successfully in {execution_time:.3f}s")
             return result
-            
+
         except Exception as e:
-            execution_time = time.time() - start_time
+            execution_time = time.perf_counter() - start_time
             logger.error(f"{func.__name__} failed after {execution_time:.3f}s: {str(e)}")
             raise
-            
+
     return wrapper
 
 
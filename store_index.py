@@ -9,7 +9,7 @@ from dotenv import load_dotenv
 from pinecone import Pinecone, ServerlessSpec
 import os
 import warnings
-from src.helper import load_pdf, split_documents, download_embeddings
+from src.helper import load_pdf, split_documents_streaming, download_embeddings
 from src.logger import get_logger, log_execution_time
 
 # Suppress warnings
@@ -45,11 +45,11 @@ def create_vector_store():
         pc = Pinecone(api_key=PINECONE_API_KEY)
         
         index_name = "medical-bot"
-        logger.info(f"Working with index: {index_name}")
+        logger.info("Working with index: %s", index_name)
         
         # Check if index exists, create if not
         if not pc.has_index(index_name):
-            logger.info(f"Index {index_name} does not exist. Creating new index...")
+            logger.info("Index %s does not exist. Creating new index...", index_name)
             pc.create_index(
                 name=index_name,
                 metric="cosine",  # Metric for similarity search
@@ -59,38 +59,37 @@ def create_vector_store():
                     region="us-east-1",
                 )
             )
-            logger.info(f"Successfully created index: {index_name}")
+            logger.info("Successfully created index: %s", index_name)
         else:
-            logger.info(f"Index {index_name} already exists")
-        
-        # Load and process documents
-        logger.info("Loading PDF documents...")
-        extracted_data = load_pdf('Data/')
-        
-        logger.info("Splitting documents into chunks...")
-        text_chunks = split_documents(extracted_data)
+            logger.info("Index %s already exists", index_name)
         
         logger.info("Initializing embeddings model...")
         embeddings = download_embeddings()
-        
-        # Create vector store
-        logger.info(f"Creating vector store with {len(text_chunks)} document chunks...")
-        vector_store = PineconeVectorStore.from_documents(
-            documents=text_chunks,
-            index_name=index_name,
-            embedding=embeddings,
-        )
-        
+
+        # Stream pages from the loader through the splitter into the index so
+        # only one batch of chunks is in memory at a time. embed_documents
+        # still sees each full batch, keeping the embedding nicely batched.
+        logger.info("Streaming PDF pages through the splitter into the vector store...")
+        vector_store = PineconeVectorStore(index=pc.Index(index_name), embedding=embeddings)
+
+        total_chunks = 0
+        for chunk_batch in split_documents_streaming(load_pdf('Data/')):
+            texts = [chunk.page_content for chunk in chunk_batch]
+            metadatas = [chunk.metadata for chunk in chunk_batch]
+            vector_store.add_texts(texts=texts, metadatas=metadatas, batch_size=100)
+            total_chunks += len(chunk_batch)
+            logger.info("Upserted %s chunks so far...", total_chunks)
+
         logger.info("Vector store created successfully!")
-        logger.info(f"Indexed {len(text_chunks)} document chunks in Pinecone")
+        logger.info("Indexed %s document chunks in Pinecone", total_chunks)
         
         return vector_store
         
     except ValueError as e:
-        logger.error(f"Configuration error: {e}")
+        logger.error("Configuration error: %s", e)
         raise
     except Exception as e:
-        logger.error(f"Error creating vector store: {str(e)}")
+        logger.error("Error creating vector store: %s", str(e))
         raise Exception(f"Failed to create vector store: {str(e)}")
 
 
@@ -105,5 +104,5 @@ if __name__ == "__main__":
         logger.info("The medical chatbot is ready to use.")
         
     except Exception as e:
-        logger.critical(f"Vector store creation failed: {str(e)}")
+        logger.critical("Vector store creation failed: %s", str(e))
         exit(1)
\ No newline at end of file
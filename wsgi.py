@@ -0,0 +1,15 @@
+"""
+WSGI entry point for serving the Medical Chatbot under Gunicorn.
+
+Run with:
+    gunicorn -k gevent -w $(nproc) --timeout 60 -b 0.0.0.0:8080 wsgi:application
+"""
+
+# grpcio is not gevent-aware: without this, every synchronous Pinecone gRPC
+# call blocks the worker's whole event loop (and can hang outright). Must run
+# before the app module creates the Pinecone client.
+import grpc.experimental.gevent
+
+grpc.experimental.gevent.init_gevent()
+
+from app import app as application  # noqa: E402